@@ -0,0 +1,307 @@
+"""
+SAP Sales Order Agent Workshop - Background Notification Dispatcher
+
+Queues email notifications so agent tools return immediately. A pool of
+async workers publishes to Amazon SNS, identical notices (same recipient,
+subject and body) are deduplicated within a window, notices for the same
+recipient are merged into one digest, and failed publishes are retried with
+backoff.
+
+Every publish carries a ``recipient`` message attribute. An SNS topic
+delivers each message to all of its subscribers, so each email subscription
+needs a filter policy on that attribute (``subscribe_recipient`` sets one up)
+or every subscriber receives every digest.
+"""
+
+import json
+import time
+import uuid
+import hashlib
+import random
+import asyncio
+import threading
+from typing import Dict, Any, Optional, List
+
+
+class LocalSNSStub:
+    """In-memory stand-in for an SNS client, for offline runs and tests."""
+
+    def __init__(self, failures_before_success: int = 0):
+        self.published: List[Dict[str, Any]] = []
+        self.subscriptions: List[Dict[str, Any]] = []
+        self.failures_before_success = failures_before_success
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def publish(self, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.failures_before_success:
+                raise ConnectionError("Simulated SNS failure")
+            self.published.append(kwargs)
+            return {"MessageId": f"stub-{len(self.published)}"}
+
+    def subscribe(self, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.subscriptions.append(kwargs)
+            return {"SubscriptionArn": f"stub-subscription-{len(self.subscriptions)}"}
+
+
+class NotificationDispatcher:
+    """Background queue that batches, deduplicates and publishes notifications.
+
+    ``topic_arn`` is required unless ``sns_client`` is a LocalSNSStub.
+    Finished notifications stay queryable through ``get_status`` for
+    ``record_retention_seconds`` (at least the dedup window) and are then
+    forgotten. A recipient's batch is split into several digests so no message
+    exceeds ``max_digest_bytes`` (SNS rejects messages over 256 KB).
+    """
+
+    def __init__(self, sns_client=None, topic_arn: Optional[str] = None,
+                 workers: int = 4,
+                 dedup_window_seconds: float = 300.0,
+                 digest_window_seconds: float = 5.0,
+                 max_retries: int = 3,
+                 backoff_base: float = 1.0,
+                 record_retention_seconds: float = 3600.0,
+                 max_digest_bytes: int = 200_000,
+                 region_name: str = "us-east-1"):
+        if not topic_arn and not isinstance(sns_client, LocalSNSStub):
+            raise ValueError("topic_arn is required to publish notifications to SNS")
+        if sns_client is None:
+            import boto3
+            sns_client = boto3.client('sns', region_name=region_name)
+        self.sns_client = sns_client
+        self.topic_arn = topic_arn
+        self.workers = workers
+        self.dedup_window_seconds = dedup_window_seconds
+        self.digest_window_seconds = digest_window_seconds
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        # Dedup hits return an existing id, so keep records at least as long as the dedup window
+        self.record_retention_seconds = max(record_retention_seconds, dedup_window_seconds)
+        self.max_digest_bytes = max_digest_bytes
+
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._recent: Dict[tuple, tuple] = {}         # (recipient, subject, body hash) -> (notification_id, queued_at)
+        self._pending: Dict[str, List[str]] = {}      # recipient -> notification ids awaiting digest flush
+        self.stats = {"queued": 0, "deduplicated": 0, "published": 0, "digests": 0, "retries": 0, "failed": 0}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    # Lifecycle
+
+    def start(self):
+        """Start the background event loop and worker pool."""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run_loop, name="notification-dispatcher", daemon=True)
+            self._thread.start()
+            self._ready.wait()
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        for i in range(self.workers):
+            self._loop.create_task(self._worker(i))
+        self._ready.set()
+        self._loop.run_forever()
+
+        # Stopped by stop(): cancel idle workers before closing the loop
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    def stop(self, timeout: float = 30.0):
+        """Flush pending digests, wait for in-flight publishes and stop the workers."""
+        with self._start_lock:
+            if not self._thread or not self._thread.is_alive():
+                return
+            future = asyncio.run_coroutine_threadsafe(self._drain(), self._loop)
+            try:
+                future.result(timeout)
+            finally:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout)
+                self._thread = None
+
+    async def _drain(self):
+        for recipient in list(self._pending):
+            self._flush_recipient(recipient)
+        await self._queue.join()
+
+    # Public API
+
+    def enqueue(self, recipient: str, subject: str, message: str) -> str:
+        """Queue a notification and return its id without waiting for delivery."""
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+
+        now = time.time()
+        dedup_key = (recipient, subject, hashlib.sha256(message.encode("utf-8")).hexdigest())
+        with self._lock:
+            recent = self._recent.get(dedup_key)
+            if recent and now - recent[1] < self.dedup_window_seconds:
+                self.stats["deduplicated"] += 1
+                return recent[0]
+
+            notification_id = f"ntf-{uuid.uuid4().hex[:12]}"
+            self._records[notification_id] = {
+                "id": notification_id,
+                "recipient": recipient,
+                "subject": subject,
+                "message": message,
+                "status": "queued",
+                "queued_at": now,
+                "attempts": 0
+            }
+            self._recent[dedup_key] = (notification_id, now)
+            self.stats["queued"] += 1
+
+            first_for_recipient = recipient not in self._pending
+            self._pending.setdefault(recipient, []).append(notification_id)
+
+        if first_for_recipient:
+            # The first notice opens a digest window; later ones for the same recipient join it
+            self._loop.call_soon_threadsafe(
+                self._loop.call_later, self.digest_window_seconds, self._flush_recipient, recipient
+            )
+        return notification_id
+
+    def get_status(self, notification_id: str) -> Optional[Dict[str, Any]]:
+        """Get the delivery status of a queued notification."""
+        with self._lock:
+            record = self._records.get(notification_id)
+            if record is None:
+                return None
+            return {k: v for k, v in record.items() if k != "message"}
+
+    def subscribe_recipient(self, email: str) -> str:
+        """Subscribe an email address to the topic, filtered to digests addressed to it.
+
+        Returns the subscription ARN; SNS emails the address a confirmation link.
+        """
+        response = self.sns_client.subscribe(
+            TopicArn=self.topic_arn,
+            Protocol="email",
+            Endpoint=email,
+            Attributes={"FilterPolicy": json.dumps({"recipient": [email]})},
+            ReturnSubscriptionArn=True
+        )
+        return response["SubscriptionArn"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get dispatcher counters and current queue depth."""
+        with self._lock:
+            pending = sum(len(ids) for ids in self._pending.values())
+        return {**self.stats, "pending_digest": pending,
+                "queue_depth": self._queue.qsize() if self._queue else 0}
+
+    # Event loop side
+
+    def _flush_recipient(self, recipient: str):
+        """Close a recipient's digest window and hand the batch to the workers."""
+        now = time.time()
+        with self._lock:
+            ids = self._pending.pop(recipient, [])
+            # Forget dedup entries that have aged out of the window
+            for key, (_, queued_at) in list(self._recent.items()):
+                if now - queued_at >= self.dedup_window_seconds:
+                    del self._recent[key]
+            # Drop finished records (and their message bodies) once past retention
+            for notification_id, record in list(self._records.items()):
+                finished_at = record.get("finished_at")
+                if finished_at is not None and now - finished_at >= self.record_retention_seconds:
+                    del self._records[notification_id]
+            batches = self._split_digest(ids)
+        for batch in batches:
+            self._queue.put_nowait(batch)
+
+    def _split_digest(self, ids: List[str]) -> List[List[str]]:
+        """Split a recipient's notices into batches whose digest stays under max_digest_bytes."""
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_bytes = 0
+        for notification_id in ids:
+            record = self._records[notification_id]
+            # Digest entry is "N. subject\nmessage\n\n"; allow for the number and the digest header
+            entry_bytes = len(record["subject"].encode("utf-8")) + len(record["message"].encode("utf-8")) + 16
+            if batch and batch_bytes + entry_bytes > self.max_digest_bytes - 200:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(notification_id)
+            batch_bytes += entry_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _build_message(self, ids: List[str]) -> tuple:
+        records = [self._records[i] for i in ids]
+        if len(records) == 1:
+            return records[0]["subject"], records[0]["message"]
+
+        subject = f"SAP Agent digest: {len(records)} notifications"
+        body = f"You have {len(records)} notifications from the SAP Sales Order Agent:\n\n"
+        for i, record in enumerate(records, 1):
+            body += f"{i}. {record['subject']}\n{record['message']}\n\n"
+        return subject, body.rstrip() + "\n"
+
+    async def _worker(self, worker_id: int):
+        while True:
+            ids = await self._queue.get()
+            try:
+                await self._deliver(ids)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, ids: List[str]):
+        with self._lock:
+            recipient = self._records[ids[0]]["recipient"]
+            subject, message = self._build_message(ids)
+
+        publish_args = {
+            "Subject": subject[:100],   # SNS subject limit
+            "Message": message,
+            "MessageAttributes": {"recipient": {"DataType": "String", "StringValue": recipient}}
+        }
+        if self.topic_arn:
+            publish_args["TopicArn"] = self.topic_arn
+
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await loop.run_in_executor(None, lambda: self.sns_client.publish(**publish_args))
+                self._mark(ids, "sent", attempt, message_id=response.get("MessageId"))
+                return
+            except Exception as e:
+                if attempt > self.max_retries:
+                    self._mark(ids, "failed", attempt, error=str(e))
+                    return
+                with self._lock:
+                    self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff_base * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    def _mark(self, ids: List[str], status: str, attempts: int, **fields):
+        with self._lock:
+            if status == "sent":
+                self.stats["published"] += 1
+                if len(ids) > 1:
+                    self.stats["digests"] += 1
+            else:
+                self.stats["failed"] += 1
+            for notification_id in ids:
+                self._records[notification_id].update(
+                    status=status, attempts=attempts, batch_size=len(ids), finished_at=time.time(), **fields
+                )
@@ -9,8 +9,9 @@ import json
 import yaml
 import boto3
 import time
-from typing import Dict, Any, Optional, List
-from datetime import datetime
+import random
+from typing import Dict, Any, Optional, List, Iterator
+from datetime import datetime, date, timedelta
 from botocore.exceptions import ClientError
 import pandas as pd
 
@@ -259,6 +260,88 @@ def create_mock_order_data() -> List[Dict[str, Any]]:
     ]
 
 
+MOCK_DELIVERY_BLOCKS = [
+    # (reason, blocked_by, relative frequency)
+    ("Credit limit exceeded", "System (Credit Check)", 40),
+    ("Incomplete documentation", "Sales Team", 20),
+    ("Quality hold", "Quality Management", 10),
+    ("Pricing approval required", "Pricing Team", 15),
+    ("Customer payment overdue", "System (Credit Check)", 15),
+]
+
+MOCK_MATERIALS = [
+    "Industrial Equipment Package A", "Software License Bundle", "Manufacturing Equipment Set",
+    "Spare Parts Kit", "Maintenance Service Contract", "Hydraulic Pump Assembly",
+    "Control Panel Upgrade", "Safety Equipment Set", "Conveyor Belt System", "Sensor Array Module",
+]
+
+MOCK_COMPANY_WORDS = [
+    "ACME", "Tech", "Global", "Apex", "Northern", "Pacific", "Summit", "Vertex", "Atlas", "Pioneer",
+    "Quantum", "Silver", "Blue", "Prime", "United", "Eagle", "Delta", "Metro", "Union", "Harbor",
+]
+
+MOCK_COMPANY_SUFFIXES = ["Corporation", "Ltd", "Inc", "Industries", "Manufacturing", "Solutions", "GmbH", "Group"]
+
+
+def generate_mock_orders(n: int, seed: Optional[int] = None,
+                         block_rate: float = 0.2,
+                         start_date: date = date(2024, 1, 1),
+                         days: int = 365) -> Iterator[Dict[str, Any]]:
+    """Stream ``n`` synthetic SAP orders with realistic, reproducible distributions.
+
+    Customers follow a long-tail (Zipf-like) order volume, order values are
+    log-normal, roughly ``block_rate`` of orders carry a weighted delivery
+    block reason, and dates spread over ``days`` from ``start_date``.
+    """
+    rng = random.Random(seed)
+
+    # A few large customers place most orders; the pool grows with the data set
+    customer_count = max(10, n // 100)
+    customer_weights = []
+    total = 0.0
+    for rank in range(1, customer_count + 1):
+        total += 1.0 / rank
+        customer_weights.append(total)
+    customers = []
+    for i in range(customer_count):
+        word = MOCK_COMPANY_WORDS[i % len(MOCK_COMPANY_WORDS)]
+        suffix = MOCK_COMPANY_SUFFIXES[(i // len(MOCK_COMPANY_WORDS)) % len(MOCK_COMPANY_SUFFIXES)]
+        name = f"{word} {suffix}"
+        series = i // (len(MOCK_COMPANY_WORDS) * len(MOCK_COMPANY_SUFFIXES))
+        if series:
+            name += f" {series + 1}"
+        customers.append((f"CUST{i + 1:06d}", name))
+    block_weights = [weight for _, _, weight in MOCK_DELIVERY_BLOCKS]
+
+    for i in range(n):
+        customer_number, customer_name = rng.choices(customers, cum_weights=customer_weights)[0]
+        order_date = start_date + timedelta(days=rng.randrange(days))
+        has_block = rng.random() < block_rate
+
+        delivery_block = None
+        if has_block:
+            reason, blocked_by, _ = rng.choices(MOCK_DELIVERY_BLOCKS, weights=block_weights)[0]
+            delivery_block = {
+                "reason": reason,
+                "blocked_date": (order_date + timedelta(days=rng.randint(0, 7))).isoformat(),
+                "blocked_by": blocked_by
+            }
+
+        yield {
+            "order_id": f"SO{i + 1:07d}",
+            "customer_number": customer_number,
+            "customer_name": customer_name,
+            "order_date": order_date.isoformat(),
+            "order_value": round(rng.lognormvariate(9.2, 0.8), 2),
+            "currency": rng.choices(("USD", "EUR", "GBP"), weights=(60, 30, 10))[0],
+            "status": "In Process" if has_block else rng.choices(("Released", "In Process", "Completed"), weights=(50, 20, 30))[0],
+            "has_delivery_block": has_block,
+            "delivery_block": delivery_block,
+            "requested_delivery_date": (order_date + timedelta(days=rng.randint(7, 45))).isoformat(),
+            "material_description": rng.choice(MOCK_MATERIALS)
+        }
+
+
 def display_architecture_progress(current_lab: int):
     """Display the current architecture progress."""
     architectures = {
@@ -0,0 +1,156 @@
+"""
+SAP Sales Order Agent Workshop - Local Persistent Memory Client
+
+SQLite-backed stand-in for the AgentCore ``MemoryClient`` used when the
+bedrock_agentcore SDK is not available. Conversations survive restarts and
+the last k turns of a session are fetched with an indexed range read.
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, List
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    id TEXT PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    event_expiry_days INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    memory_id TEXT NOT NULL,
+    actor_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_session_ts
+    ON events (memory_id, actor_id, session_id, ts);
+"""
+
+
+class LocalMemoryClient:
+    """Drop-in local replacement for MemoryClient backed by SQLite."""
+
+    def __init__(self, region_name: Optional[str] = None,
+                 db_path: str = "agent_memory.db",
+                 max_events_per_session: Optional[int] = None):
+        self.region_name = region_name
+        self.db_path = db_path
+        # Oldest turns beyond this many per session are dropped on write
+        self.max_events_per_session = max_events_per_session
+        self._local = threading.local()
+        self._ts_lock = threading.Lock()
+        self._last_ts = 0
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            # Continue after stored turns so a restart or a clock step back never orders new turns first
+            self._last_ts = conn.execute("SELECT MAX(ts) FROM events").fetchone()[0] or 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection (runtime worker threads each get their own)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _next_ts(self) -> int:
+        """Strictly increasing event timestamp in nanoseconds."""
+        with self._ts_lock:
+            self._last_ts = max(time.time_ns(), self._last_ts + 1)
+            return self._last_ts
+
+    def create_memory_and_wait(self, **kwargs) -> Dict[str, Any]:
+        """Create a memory resource, or return the existing one with the same name."""
+        name = kwargs.get('name', 'mock-memory')
+        # Generate AWS-compliant memory ID: name-randomstring
+        candidate_id = f"{name}-{uuid.uuid4().hex[:10]}"
+        conn = self._connection()
+        with conn:
+            # Atomic get-or-create: if another thread or process won the race the
+            # insert is ignored and both callers read back the same id
+            conn.execute(
+                "INSERT OR IGNORE INTO memories (id, name, description, event_expiry_days, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (candidate_id, name, kwargs.get('description'), kwargs.get('event_expiry_days'), time.time())
+            )
+            memory_id = conn.execute("SELECT id FROM memories WHERE name = ?", (name,)).fetchone()[0]
+        return {'id': memory_id, 'name': name, 'status': 'ACTIVE'}
+
+    def _event_row(self, memory_id, actor_id, session_id, messages) -> tuple:
+        # Convert messages to the expected format
+        turn = [{'role': role, 'content': {'text': message_text}} for message_text, role in messages]
+        event_id = f"event-{uuid.uuid4().hex}"
+        return (event_id, memory_id, actor_id, session_id, self._next_ts(), json.dumps(turn))
+
+    def create_event(self, memory_id, actor_id, session_id, messages) -> Dict[str, Any]:
+        """Store one conversation turn."""
+        row = self._event_row(memory_id, actor_id, session_id, messages)
+        self._insert_events([row])
+        return {'eventId': row[0]}
+
+    def create_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store many turns in one transaction.
+
+        Each event is a dict with ``memory_id``, ``actor_id``, ``session_id``
+        and ``messages`` as accepted by ``create_event``.
+        """
+        rows = [
+            self._event_row(e['memory_id'], e['actor_id'], e['session_id'], e['messages'])
+            for e in events
+        ]
+        self._insert_events(rows)
+        return [{'eventId': row[0]} for row in rows]
+
+    def _insert_events(self, rows: List[tuple]):
+        if not rows:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO events (event_id, memory_id, actor_id, session_id, ts, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            if self.max_events_per_session:
+                for session in {(row[1], row[2], row[3]) for row in rows}:
+                    self._apply_retention(conn, *session)
+
+    def _apply_retention(self, conn: sqlite3.Connection, memory_id, actor_id, session_id):
+        # Find the ts of the oldest turn to keep via the index, then trim everything older
+        cutoff = conn.execute(
+            "SELECT ts FROM events WHERE memory_id = ? AND actor_id = ? AND session_id = ? "
+            "ORDER BY ts DESC LIMIT 1 OFFSET ?",
+            (memory_id, actor_id, session_id, self.max_events_per_session - 1)
+        ).fetchone()
+        if cutoff:
+            conn.execute(
+                "DELETE FROM events WHERE memory_id = ? AND actor_id = ? AND session_id = ? AND ts < ?",
+                (memory_id, actor_id, session_id, cutoff[0])
+            )
+
+    def get_last_k_turns(self, memory_id, actor_id, session_id, k=5) -> List[List[Dict[str, Any]]]:
+        """Get the last k turns of a session, oldest first."""
+        rows = self._connection().execute(
+            "SELECT payload FROM events WHERE memory_id = ? AND actor_id = ? AND session_id = ? "
+            "ORDER BY ts DESC LIMIT ?",
+            (memory_id, actor_id, session_id, k)
+        ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def close(self):
+        """Close this thread's database connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,220 @@
+"""
+SAP Sales Order Agent Workshop - Bulk Delivery Block Release
+
+Releases delivery blocks on many sales orders at once through a
+SAPSalesOrderService, running the SAP writes concurrently.
+"""
+
+import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List
+
+
+# HTTP status codes worth retrying (throttling and gateway/server hiccups)
+TRANSIENT_HTTP_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient_failure(result: Dict[str, Any]) -> bool:
+    """Check whether a failed remove_delivery_block result is worth retrying."""
+    if result.get("csrf_invalid"):
+        return True
+    status = result.get("status")
+    if status is None:
+        match = re.search(r"HTTP (\d{3})", result.get("error", ""))
+        status = int(match.group(1)) if match else None
+    if status is not None:
+        return status in TRANSIENT_HTTP_STATUSES
+
+    # Connection errors and CSRF fetch failures surface without a status code
+    error = result.get("error", "")
+    return error.startswith("Error removing delivery block") or "CSRF" in error
+
+
+def select_blocked_orders(orders: List[Dict[str, Any]],
+                          block_reason: Optional[str] = None,
+                          customer: Optional[str] = None,
+                          min_value: Optional[float] = None) -> List[str]:
+    """Filter OData sales orders by block reason, customer and value threshold."""
+    selected = []
+    for order in orders:
+        if not order.get("DeliveryBlockReason"):
+            continue
+        if block_reason:
+            reasons = (order.get("DeliveryBlockReason", ""), order.get("DeliveryBlockReasonText", ""))
+            if not any(block_reason.lower() in r.lower() for r in reasons if r):
+                continue
+        if customer:
+            customers = (order.get("SoldToParty", ""), order.get("CustomerName", ""))
+            if not any(customer.lower() in c.lower() for c in customers if c):
+                continue
+        if min_value is not None and float(order.get("TotalNetAmount") or 0) < min_value:
+            continue
+        selected.append(order["SalesOrder"])
+    return selected
+
+
+def _odata_string(value: str) -> str:
+    """Quote a value as an OData string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def build_blocked_orders_filter(block_reason: Optional[str] = None,
+                                customer: Optional[str] = None,
+                                min_value: Optional[float] = None) -> str:
+    """
+    Build an OData $filter for blocked orders so SAP applies the bulk release criteria.
+
+    A_SalesOrder has no customer name or block reason text, so against SAP
+    ``block_reason`` must be a DeliveryBlockReason code (e.g. "01") and
+    ``customer`` a SoldToParty number.
+    """
+    clauses = ["DeliveryBlockReason ne ''"]
+    if block_reason:
+        clauses.append(f"DeliveryBlockReason eq {_odata_string(block_reason)}")
+    if customer:
+        clauses.append(f"SoldToParty eq {_odata_string(customer)}")
+    if min_value is not None:
+        clauses.append(f"TotalNetAmount ge {min_value:f}M")
+    return " and ".join(clauses)
+
+
+class SharedCsrfSession:
+    """One CSRF token/cookie pair shared by all bulk workers, refreshed when SAP rejects it."""
+
+    def __init__(self, sap_service):
+        self.sap_service = sap_service
+        self._lock = threading.Lock()
+        self.current = sap_service.fetch_csrf_session()
+
+    def refresh(self, rejected: Optional[Dict[str, Any]]):
+        """Fetch a new session unless another worker already replaced the rejected one."""
+        with self._lock:
+            if self.current is rejected:
+                self.current = self.sap_service.fetch_csrf_session()
+
+
+def release_with_retry(sap_service, sales_order_id: str, agent_identifier: str,
+                       max_retries: int = 3, backoff_base: float = 0.5,
+                       csrf: Optional[SharedCsrfSession] = None) -> Dict[str, Any]:
+    """Remove the delivery block from one order, retrying transient failures with backoff."""
+    attempt = 0
+    while True:
+        attempt += 1
+        csrf_session = csrf.current if csrf else None
+        try:
+            if csrf_session:
+                result = sap_service.remove_delivery_block(sales_order_id, agent_identifier,
+                                                           csrf_session=csrf_session)
+            else:
+                result = sap_service.remove_delivery_block(sales_order_id, agent_identifier)
+        except Exception as e:
+            result = {"success": False, "error": f"Error removing delivery block: {str(e)}"}
+
+        if result.get("success") or attempt > max_retries or not is_transient_failure(result):
+            result["attempts"] = attempt
+            return result
+
+        if csrf and result.get("csrf_invalid"):
+            csrf.refresh(csrf_session)
+
+        # Exponential backoff with jitter so parallel workers do not retry in lockstep
+        time.sleep(backoff_base * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+
+def bulk_release_delivery_blocks(sap_service,
+                                 order_ids: Optional[List[str]] = None,
+                                 block_reason: Optional[str] = None,
+                                 customer: Optional[str] = None,
+                                 min_value: Optional[float] = None,
+                                 max_workers: int = 8,
+                                 max_retries: int = 3,
+                                 backoff_base: float = 0.5,
+                                 scan_limit: int = 500,
+                                 agent_identifier: str = "SAP-Agent-Bulk") -> Dict[str, Any]:
+    """
+    Release delivery blocks on many sales orders concurrently.
+
+    Orders are taken from ``order_ids`` or, when not given, selected with the
+    filter arguments. Services with ``find_blocked_order_ids`` return every
+    match (the real API pushes the filters down to OData); otherwise the first
+    ``scan_limit`` blocked orders are scanned and the summary's ``truncated``
+    flag says when more may exist. Every
+    order goes through ``sap_service.remove_delivery_block`` so each one still
+    gets its own audit note in SAP. Against the real API all workers share one
+    CSRF token/cookie pair fetched up front.
+    """
+    started = time.time()
+
+    scanned = None
+    truncated = False
+    if order_ids is None and hasattr(sap_service, "find_blocked_order_ids"):
+        order_ids = sap_service.find_blocked_order_ids(block_reason, customer, min_value)
+    elif order_ids is None:
+        blocked_orders = sap_service.get_sales_orders_with_delivery_blocks(top=scan_limit)
+        scanned = len(blocked_orders)
+        truncated = scanned >= scan_limit
+        order_ids = select_blocked_orders(blocked_orders, block_reason, customer, min_value)
+
+    # Keep the caller's order but never write the same order twice
+    order_ids = list(dict.fromkeys(order_ids))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    if order_ids:
+        csrf = None
+        if getattr(sap_service, "use_real_api", False) and hasattr(sap_service, "fetch_csrf_session"):
+            csrf = SharedCsrfSession(sap_service)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(order_ids)))) as executor:
+            futures = {
+                order_id: executor.submit(release_with_retry, sap_service, order_id,
+                                          agent_identifier, max_retries, backoff_base, csrf)
+                for order_id in order_ids
+            }
+            for order_id, future in futures.items():
+                results[order_id] = future.result()
+
+    released = [oid for oid in order_ids if results[oid].get("success")]
+    failed = [
+        {
+            "sales_order": oid,
+            "error": results[oid].get("error", "Unknown error"),
+            "attempts": results[oid].get("attempts", 1)
+        }
+        for oid in order_ids if not results[oid].get("success")
+    ]
+
+    return {
+        "success": not failed,
+        "requested": len(order_ids),
+        "released": released,
+        "failed": failed,
+        "notes_added": sum(1 for oid in released if results[oid].get("note_added")),
+        "scanned": scanned,
+        "truncated": truncated,
+        "duration_seconds": round(time.time() - started, 3)
+    }
+
+
+def format_bulk_release_summary(summary: Dict[str, Any]) -> str:
+    """Format a bulk release summary as a compact message for the agent."""
+    truncated_note = ""
+    if summary.get("truncated"):
+        truncated_note = (f"⚠️ Only the first {summary['scanned']} blocked orders were scanned; "
+                          f"more orders may match. Run the release again to continue.\n")
+
+    if not summary["requested"]:
+        return truncated_note + "No sales orders matched the bulk release criteria."
+
+    result = f"🔓 **Bulk release:** {len(summary['released'])}/{summary['requested']} orders released"
+    result += f" in {summary['duration_seconds']:.1f}s ({summary['notes_added']} audit notes added)\n"
+
+    if summary["released"]:
+        result += f"✅ Released: {', '.join(summary['released'])}\n"
+    if summary["failed"]:
+        result += f"❌ Failed ({len(summary['failed'])}):\n"
+        for failure in summary["failed"]:
+            result += f"   - {failure['sales_order']}: {failure['error']} (attempts: {failure['attempts']})\n"
+
+    return result + truncated_note
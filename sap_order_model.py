@@ -0,0 +1,332 @@
+"""
+SAP Sales Order Agent Workshop - Compact Order Table
+
+Columnar, array-backed storage for large numbers of sales orders. Repeated
+strings (customers, currencies, statuses, block reasons, materials) are
+interned once and rows hold small integer codes, so a million orders take a
+few dozen megabytes instead of the best part of a gigabyte as nested dicts.
+"""
+
+import re
+import math
+import time
+import tracemalloc
+from array import array
+from datetime import date, datetime, timezone
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Hashable
+
+from sap_order_sync import parse_odata_datetime
+
+
+# OData delivery block codes as used by the Lab 3 mock SAP service; workshop
+# orders with any other reason text are given UNKNOWN_BLOCK_CODE
+UNKNOWN_BLOCK_CODE = "99"
+
+DELIVERY_BLOCK_CODES = {
+    "Credit limit exceeded": "01",
+    "Incomplete documentation": "02",
+    "Quality hold": "03",
+    "Pricing approval required": "04",
+    "Customer payment overdue": "05",
+}
+
+NO_DATE = 0
+NO_VALUE = math.nan                 # missing amount or timestamp in a float column
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+ORDER_ID_PATTERN = re.compile(r"^(\D*)(\d+)$")
+
+
+def _to_ordinal(value: Optional[str]) -> int:
+    """Convert an ISO date or OData v2 '/Date(ms)/' string to a date ordinal."""
+    if not value:
+        return NO_DATE
+    if value.startswith("/Date("):
+        timestamp = parse_odata_datetime(value)
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).date().toordinal()
+    return date.fromisoformat(value[:10]).toordinal()
+
+
+def _from_ordinal(ordinal: int) -> Optional[str]:
+    """Convert a date ordinal back to an ISO date string."""
+    return date.fromordinal(ordinal).isoformat() if ordinal != NO_DATE else None
+
+
+def _odata_date(ordinal: int, odata_dates: bool) -> Optional[str]:
+    """Format a date ordinal as an OData date, as '/Date(ms)/' or ISO like the source row."""
+    if ordinal == NO_DATE:
+        return None
+    if odata_dates:
+        return f"/Date({(ordinal - EPOCH_ORDINAL) * 86_400_000})/"
+    return f"{date.fromordinal(ordinal).isoformat()}T00:00:00"
+
+
+def _odata_timestamp(timestamp: float, odata_dates: bool) -> Optional[str]:
+    """Format epoch seconds as an OData timestamp, as '/Date(ms)/' or ISO like the source row."""
+    if math.isnan(timestamp):
+        return None
+    if odata_dates:
+        return f"/Date({round(timestamp * 1000)})/"
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class StringPool:
+    """Intern table mapping repeated values to small integer codes."""
+
+    def __init__(self):
+        self.values: List[Hashable] = []
+        self.codes: Dict[Hashable, int] = {}
+
+    def intern(self, value: Hashable) -> int:
+        """Get the code for a value, adding it to the pool if new."""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def __getitem__(self, code: int) -> Hashable:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class OrderTable:
+    """Columnar sales order table with conversion to and from workshop and OData dicts."""
+
+    def __init__(self):
+        self.order_id_format = array('H')   # code into id_formats: (prefix, digits)
+        self.order_id_number = array('Q')
+        self.customer = array('I')          # code into customers: (customer_number, customer_name)
+        self.order_date = array('i')        # date ordinal
+        self.order_value = array('d')
+        self.currency = array('B')          # code into currencies
+        self.status = array('B')            # code into statuses
+        self.block = array('H')             # code into blocks: (code, text, blocked_by); 0 = no block
+        self.blocked_date = array('i')      # date ordinal, NO_DATE when unblocked
+        self.requested_delivery_date = array('i')
+        self.material = array('H')          # code into materials
+        self.last_change = array('d')       # LastChangeDateTime as epoch seconds, NO_VALUE if unknown
+        self.odata_dates = array('B')       # 1 if the source row used OData v2 '/Date(ms)/' literals
+
+        self.id_formats = StringPool()
+        self.customers = StringPool()
+        self.currencies = StringPool()
+        self.statuses = StringPool()
+        self.blocks = StringPool()
+        self.materials = StringPool()
+        self.blocks.intern(None)            # reserve code 0 for "no delivery block"
+
+        self._index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.order_id_number)
+
+    def order_id(self, row: int) -> str:
+        """Get the order id of a row."""
+        prefix, digits = self.id_formats[self.order_id_format[row]]
+        return f"{prefix}{self.order_id_number[row]:0{digits}d}" if digits else prefix
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self.to_order(row)
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[Dict[str, Any]]) -> "OrderTable":
+        """Build a table from workshop order dicts (any iterable, including generators)."""
+        table = cls()
+        for order in orders:
+            table.append_order(order)
+        return table
+
+    @classmethod
+    def from_odata(cls, orders: Iterable[Dict[str, Any]]) -> "OrderTable":
+        """Build a table from OData A_SalesOrder dicts."""
+        table = cls()
+        for order in orders:
+            table.append_odata(order)
+        return table
+
+    def append_order(self, order: Dict[str, Any]) -> int:
+        """Append a workshop order dict (create_mock_order_data shape); returns its row."""
+        block = order.get("delivery_block") if order.get("has_delivery_block") else None
+        return self._append(
+            order_id=order["order_id"],
+            customer=(order["customer_number"], order["customer_name"]),
+            order_date=order.get("order_date"),
+            order_value=order["order_value"],
+            currency=order["currency"],
+            status=order.get("status", ""),
+            block=(DELIVERY_BLOCK_CODES.get(block["reason"], UNKNOWN_BLOCK_CODE),
+                   block["reason"], block.get("blocked_by")) if block else None,
+            blocked_date=block.get("blocked_date") if block else None,
+            requested_delivery_date=order.get("requested_delivery_date"),
+            material=order.get("material_description", "")
+        )
+
+    def append_odata(self, order: Dict[str, Any]) -> int:
+        """Append an OData A_SalesOrder dict; returns its row.
+
+        Absent fields are kept as None (or NO_VALUE) so ``to_odata`` leaves them out again.
+        """
+        block_code = order.get("DeliveryBlockReason")
+        amount = order.get("TotalNetAmount")
+        dates = (order.get("SalesOrderDate"), order.get("RequestedDeliveryDate"), order.get("LastChangeDateTime"))
+        last_change = parse_odata_datetime(order.get("LastChangeDateTime"))
+        return self._append(
+            order_id=order["SalesOrder"],
+            customer=(order.get("SoldToParty"), order.get("CustomerName")),
+            order_date=order.get("SalesOrderDate"),
+            order_value=float(amount) if amount not in (None, "") else NO_VALUE,
+            currency=order.get("TransactionCurrency"),
+            status=order.get("OverallSDProcessStatus"),
+            block=(block_code, order.get("DeliveryBlockReasonText"), None) if block_code else None,
+            blocked_date=None,
+            requested_delivery_date=order.get("RequestedDeliveryDate"),
+            material="",
+            last_change=last_change if last_change is not None else NO_VALUE,
+            odata_dates=any(isinstance(value, str) and value.startswith("/Date(") for value in dates)
+        )
+
+    def _append(self, order_id, customer, order_date, order_value, currency, status,
+                block, blocked_date, requested_delivery_date, material,
+                last_change=NO_VALUE, odata_dates=False) -> int:
+        row = len(self)
+        # Ids like "SO001234" are kept as an interned (prefix, width) plus an integer
+        match = ORDER_ID_PATTERN.match(order_id)
+        if match:
+            self.order_id_format.append(self.id_formats.intern((match.group(1), len(match.group(2)))))
+            self.order_id_number.append(int(match.group(2)))
+        else:
+            self.order_id_format.append(self.id_formats.intern((order_id, 0)))
+            self.order_id_number.append(0)
+        self.customer.append(self.customers.intern(customer))
+        self.order_date.append(_to_ordinal(order_date))
+        self.order_value.append(order_value)
+        self.currency.append(self.currencies.intern(currency))
+        self.status.append(self.statuses.intern(status))
+        self.block.append(self.blocks.intern(block) if block else 0)
+        self.blocked_date.append(_to_ordinal(blocked_date))
+        self.requested_delivery_date.append(_to_ordinal(requested_delivery_date))
+        self.material.append(self.materials.intern(material))
+        self.last_change.append(last_change)
+        self.odata_dates.append(1 if odata_dates else 0)
+        if self._index is not None:
+            self._index[order_id] = row
+        return row
+
+    def find(self, order_id: str) -> Optional[int]:
+        """Get the row for an order id (the id index is built on first lookup)."""
+        if self._index is None:
+            self._index = {self.order_id(row): row for row in range(len(self))}
+        return self._index.get(order_id)
+
+    def has_delivery_block(self, row: int) -> bool:
+        return self.block[row] != 0
+
+    def blocked_rows(self) -> Iterator[int]:
+        """Iterate over the rows that have a delivery block."""
+        return (row for row, code in enumerate(self.block) if code)
+
+    def remove_delivery_block(self, row: int):
+        """Clear the delivery block on a row."""
+        self.block[row] = 0
+        self.blocked_date[row] = NO_DATE
+
+    def to_order(self, row: int) -> Dict[str, Any]:
+        """Materialise a row as a workshop order dict."""
+        customer_number, customer_name = self.customers[self.customer[row]]
+        block = self.blocks[self.block[row]]
+        return {
+            "order_id": self.order_id(row),
+            "customer_number": customer_number,
+            "customer_name": customer_name,
+            "order_date": _from_ordinal(self.order_date[row]),
+            "order_value": self.order_value[row],
+            "currency": self.currencies[self.currency[row]],
+            "status": self.statuses[self.status[row]],
+            "has_delivery_block": block is not None,
+            "delivery_block": {
+                "reason": block[1] or block[0],
+                "blocked_date": _from_ordinal(self.blocked_date[row]),
+                "blocked_by": block[2]
+            } if block else None,
+            "requested_delivery_date": _from_ordinal(self.requested_delivery_date[row]),
+            "material_description": self.materials[self.material[row]]
+        }
+
+    def to_odata(self, row: int) -> Dict[str, Any]:
+        """Materialise a row as an OData A_SalesOrder dict (fields without a value are left out)."""
+        customer_number, customer_name = self.customers[self.customer[row]]
+        block = self.blocks[self.block[row]]
+        order_value = self.order_value[row]
+        odata_dates = bool(self.odata_dates[row])
+        order = {
+            "SalesOrder": self.order_id(row),
+            "SoldToParty": customer_number,
+            "CustomerName": customer_name,
+            "TotalNetAmount": f"{order_value:.2f}" if not math.isnan(order_value) else None,
+            "TransactionCurrency": self.currencies[self.currency[row]],
+            "DeliveryBlockReason": block[0] if block else "",
+            "DeliveryBlockReasonText": block[1] if block else None,
+            "SalesOrderDate": _odata_date(self.order_date[row], odata_dates),
+            "OverallSDProcessStatus": self.statuses[self.status[row]],
+            "RequestedDeliveryDate": _odata_date(self.requested_delivery_date[row], odata_dates),
+            "LastChangeDateTime": _odata_timestamp(self.last_change[row], odata_dates)
+        }
+        return {key: value for key, value in order.items() if value is not None}
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the column arrays (excluding intern pools)."""
+        columns = (self.order_id_format, self.order_id_number, self.customer, self.order_date,
+                   self.order_value, self.currency, self.status, self.block, self.blocked_date,
+                   self.requested_delivery_date, self.material, self.last_change, self.odata_dates)
+        return sum(col.itemsize * len(col) for col in columns)
+
+
+def benchmark_order_storage(sizes=(10_000, 100_000, 1_000_000), seed: int = 42) -> List[Dict[str, Any]]:
+    """Compare memory and blocked-order scan time of nested dicts versus OrderTable."""
+    from utils import generate_mock_orders
+
+    results = []
+    for n in sizes:
+        tracemalloc.start()
+        orders = list(generate_mock_orders(n, seed=seed))
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        dict_blocked_value = sum(o["order_value"] for o in orders if o["has_delivery_block"])
+        dict_scan = time.perf_counter() - start
+        del orders
+
+        tracemalloc.start()
+        table = OrderTable.from_orders(generate_mock_orders(n, seed=seed))
+        table_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        values = table.order_value
+        table_blocked_value = sum(values[row] for row in table.blocked_rows())
+        table_scan = time.perf_counter() - start
+
+        assert abs(dict_blocked_value - table_blocked_value) < 1e-3 * max(1.0, dict_blocked_value)
+        results.append({
+            "orders": n,
+            "dict_mb": round(dict_bytes / 1e6, 1),
+            "table_mb": round(table_bytes / 1e6, 1),
+            "dict_scan_ms": round(dict_scan * 1000, 1),
+            "table_scan_ms": round(table_scan * 1000, 1)
+        })
+        del table
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'orders':>10} {'dict MB':>10} {'table MB':>10} {'dict scan ms':>14} {'table scan ms':>14}")
+    for result in benchmark_order_storage():
+        print(f"{result['orders']:>10,} {result['dict_mb']:>10} {result['table_mb']:>10} "
+              f"{result['dict_scan_ms']:>14} {result['table_scan_ms']:>14}")
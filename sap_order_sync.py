@@ -0,0 +1,358 @@
+"""
+SAP Sales Order Agent Workshop - Local Sales Order Store and Delta Sync
+
+Keeps a local SQLite copy of SAP sales orders so that listings, counts and
+per-customer aggregates can be answered without a live OData query.
+"""
+
+import re
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone
+
+
+ORDER_COLUMNS = [
+    "sales_order", "sold_to_party", "customer_name", "total_net_amount",
+    "currency", "delivery_block_reason", "delivery_block_reason_text",
+    "sales_order_date", "last_change_ts", "synced_at", "raw"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales_orders (
+    sales_order TEXT PRIMARY KEY,
+    sold_to_party TEXT,
+    customer_name TEXT,
+    total_net_amount REAL,
+    currency TEXT,
+    delivery_block_reason TEXT NOT NULL DEFAULT '',
+    delivery_block_reason_text TEXT,
+    sales_order_date TEXT,
+    last_change_ts REAL,
+    synced_at REAL,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sales_orders_block
+    ON sales_orders (delivery_block_reason, sales_order);
+CREATE INDEX IF NOT EXISTS idx_sales_orders_customer
+    ON sales_orders (sold_to_party, delivery_block_reason);
+CREATE INDEX IF NOT EXISTS idx_sales_orders_last_change
+    ON sales_orders (last_change_ts);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def parse_odata_datetime(value: Any) -> Optional[float]:
+    """Parse an OData v2 '/Date(ms)/' or ISO 8601 timestamp into epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = re.match(r"/Date\((-?\d+)([+-]\d{4})?\)/", value)
+    if match:
+        return int(match.group(1)) / 1000.0
+
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_odata_datetimeoffset(timestamp: float) -> str:
+    """Format epoch seconds as an OData datetimeoffset filter literal."""
+    iso = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return f"datetimeoffset'{iso}'"
+
+
+class SalesOrderStore:
+    """Indexed SQLite store of SAP sales orders in OData (A_SalesOrder) shape."""
+
+    def __init__(self, db_path: str = "sap_orders.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _order_row(self, order: Dict[str, Any], synced_at: float) -> tuple:
+        amount = order.get("TotalNetAmount")
+        return (
+            order["SalesOrder"],
+            order.get("SoldToParty"),
+            order.get("CustomerName"),
+            float(amount) if amount not in (None, "") else None,
+            order.get("TransactionCurrency"),
+            order.get("DeliveryBlockReason") or "",
+            order.get("DeliveryBlockReasonText"),
+            order.get("SalesOrderDate"),
+            parse_odata_datetime(order.get("LastChangeDateTime")),
+            synced_at,
+            json.dumps(order, default=str)
+        )
+
+    def upsert_orders(self, orders: List[Dict[str, Any]]) -> int:
+        """Insert or update a batch of OData sales orders in one transaction."""
+        if not orders:
+            return 0
+        synced_at = time.time()
+        rows = [self._order_row(order, synced_at) for order in orders]
+        placeholders = ", ".join("?" for _ in ORDER_COLUMNS)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in ORDER_COLUMNS[1:])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO sales_orders ({', '.join(ORDER_COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(sales_order) DO UPDATE SET {updates}",
+                rows
+            )
+        return len(rows)
+
+    def get_order(self, sales_order_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single sales order in OData shape."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT raw FROM sales_orders WHERE sales_order = ?", (sales_order_id,)
+            ).fetchone()
+        return json.loads(row["raw"]) if row else None
+
+    def get_blocked_orders(self, top: int = 5, sold_to_party: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get sales orders that have a delivery block, optionally for one customer."""
+        query = "SELECT raw FROM sales_orders WHERE delivery_block_reason != ''"
+        params: List[Any] = []
+        if sold_to_party:
+            query += " AND sold_to_party = ?"
+            params.append(sold_to_party)
+        query += " ORDER BY sales_order LIMIT ?"
+        params.append(top)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [json.loads(row["raw"]) for row in rows]
+
+    def count_blocked_orders(self) -> int:
+        """Count sales orders with an active delivery block."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM sales_orders WHERE delivery_block_reason != ''"
+            ).fetchone()
+        return row[0]
+
+    def get_customer_aggregates(self, blocked_only: bool = True) -> List[Dict[str, Any]]:
+        """Get order counts and net value per customer and currency."""
+        query = (
+            "SELECT sold_to_party, MAX(customer_name) AS customer_name, currency, "
+            "COUNT(*) AS order_count, SUM(total_net_amount) AS total_net_amount "
+            "FROM sales_orders"
+        )
+        if blocked_only:
+            query += " WHERE delivery_block_reason != ''"
+        query += " GROUP BY sold_to_party, currency ORDER BY total_net_amount DESC"
+        with self._lock:
+            rows = self._conn.execute(query).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_delivery_block_removed(self, sales_order_id: str) -> bool:
+        """Clear the delivery block on the local row after a successful SAP write."""
+        order = self.get_order(sales_order_id)
+        if order is None:
+            return False
+        order["DeliveryBlockReason"] = ""
+        order["DeliveryBlockReasonText"] = ""
+        self.upsert_orders([order])
+        return True
+
+    def count_orders(self) -> int:
+        """Count all sales orders in the store."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sales_orders").fetchone()[0]
+
+    def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Get a sync bookkeeping value."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_state(self, key: str, value: Any):
+        """Set a sync bookkeeping value."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, str(value))
+            )
+
+    def reset(self):
+        """Delete every order and all sync bookkeeping."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sales_orders")
+            self._conn.execute("DELETE FROM sync_state")
+
+    def is_synced_from(self, source: str) -> bool:
+        """Check whether a full load from this data source has completed."""
+        return self.get_state("source") == source and self.get_state("full_load_at") is not None
+
+    def max_last_change(self) -> Optional[float]:
+        """Get the newest LastChangeDateTime seen so far (epoch seconds)."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(last_change_ts) FROM sales_orders").fetchone()
+        return row[0]
+
+
+class SalesOrderSyncEngine:
+    """Full load followed by periodic LastChangeDateTime delta pulls into a SalesOrderStore.
+
+    The store remembers which data source (``sap_service.data_source``) it was
+    loaded from. When the source differs, e.g. a different SAP system or a
+    switch between mock and real data, the store is wiped and fully reloaded.
+    """
+
+    def __init__(self, sap_service, store: SalesOrderStore,
+                 interval_seconds: int = 60, page_size: int = 1000,
+                 overlap_seconds: int = 5):
+        self.sap_service = sap_service
+        self.store = store
+        self.interval_seconds = interval_seconds
+        self.page_size = page_size
+        # Re-read a small window before the watermark so same-second changes are not missed
+        self.overlap_seconds = overlap_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sync_lock = threading.Lock()
+        self.stats = {
+            "last_sync_at": None,
+            "last_sync_duration": None,
+            "last_sync_rows": 0,
+            "total_rows_synced": 0,
+            "sync_count": 0,
+            "error_count": 0,
+            "last_error": None,
+            "lag_seconds": None
+        }
+
+    def _pull(self, changed_since: Optional[float], watermark: Optional[float]) -> tuple:
+        """Page through SAP and upsert every page.
+
+        Returns the rows written and the oldest change newer than the previous
+        watermark, which is how long the slowest new change waited to arrive.
+        """
+        rows = 0
+        skip = 0
+        oldest_new_change = None
+        while True:
+            page = self.sap_service.get_sales_orders_page(
+                skip=skip, top=self.page_size, changed_since=changed_since
+            )
+            rows += self.store.upsert_orders(page)
+            if watermark is not None:
+                for order in page:
+                    changed = parse_odata_datetime(order.get("LastChangeDateTime"))
+                    if changed is not None and changed > watermark:
+                        if oldest_new_change is None or changed < oldest_new_change:
+                            oldest_new_change = changed
+            if len(page) < self.page_size:
+                return rows, oldest_new_change
+            skip += self.page_size
+
+    def full_load(self) -> int:
+        """Load every sales order from SAP into the local store."""
+        return self._run_sync(full=True)
+
+    def sync_delta(self) -> int:
+        """Pull only orders changed since the last sync (falls back to a full load)."""
+        return self._run_sync(full=False)
+
+    def _run_sync(self, full: bool) -> int:
+        # One sync at a time: the background loop and manual calls share the store and stats
+        with self._sync_lock:
+            started = time.time()
+            source = self.sap_service.data_source
+            if self.store.get_state("source") != source:
+                # Rows and watermark from another source are meaningless here
+                self.store.reset()
+                self.store.set_state("source", source)
+            # Decided under the lock so a concurrent caller cannot start a second full load
+            full = full or not self.store.is_synced_from(source)
+
+            changed_since = None
+            watermark = None
+            if not full:
+                watermark = self.store.max_last_change()
+                if watermark is not None:
+                    changed_since = watermark - self.overlap_seconds
+
+            try:
+                rows, oldest_new_change = self._pull(changed_since, watermark)
+            except Exception as e:
+                self.stats["error_count"] += 1
+                self.stats["last_error"] = str(e)
+                raise
+
+            finished = time.time()
+            if full:
+                self.store.set_state("full_load_at", finished)
+            self.store.set_state("last_sync_at", finished)
+            self.stats.update({
+                "last_sync_at": finished,
+                "last_sync_duration": round(finished - started, 3),
+                "last_sync_rows": rows,
+                "total_rows_synced": self.stats["total_rows_synced"] + rows,
+                "sync_count": self.stats["sync_count"] + 1,
+                "lag_seconds": round(finished - oldest_new_change, 3) if oldest_new_change else 0.0
+            })
+            return rows
+
+    def is_ready(self) -> bool:
+        """Check whether a full load from the current source has completed."""
+        return self.store.is_synced_from(self.sap_service.data_source)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get sync health metrics.
+
+        ``staleness_seconds`` is the time since the local copy was last refreshed;
+        ``lag_seconds`` is how long the oldest change picked up by the last delta
+        sync had been waiting in SAP.
+        """
+        last_sync = self.store.get_state("last_sync_at")
+        last_sync = float(last_sync) if last_sync else None
+        return {
+            **self.stats,
+            "orders_in_store": self.store.count_orders(),
+            "staleness_seconds": round(time.time() - last_sync, 3) if last_sync else None,
+            "running": self._thread is not None and self._thread.is_alive()
+        }
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.sync_delta()
+            except Exception as e:
+                print(f"⚠️ Delta sync failed: {e}")
+
+    def start(self):
+        """Run the initial load if needed and start the background delta sync loop."""
+        if not self.is_ready():
+            self.sync_delta()       # falls back to a full load under the sync lock
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="sap-order-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the background delta sync loop."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None